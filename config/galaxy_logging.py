@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Structured logging helpers for Galaxy (Pulp) containers.
+#
+# Enabled from settings.py when LOG_FORMAT=json. Records are handed to a
+# background thread through a bounded queue, so gunicorn workers never block
+# on stdout; JSON formatting happens on that thread, not on the request path.
+
+# Attributes of a plain LogRecord; anything else was passed through `extra`.
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON line, including any `extra` fields."""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in payload and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc_info'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class DebugSampleFilter(logging.Filter):
+    """Let through only a fraction of DEBUG records; higher levels always pass."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = min(max(float(rate), 0.0), 1.0)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return self.rate > 0.0 and random.random() < self.rate
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; give the thread time to make room.
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class AsyncJsonHandler(QueueHandler):
+    """Queue records for a background listener that writes JSON to stderr.
+
+    The listener is started lazily, and a forked child (gunicorn worker,
+    pulpcore-worker task) gets a fresh queue and its own listener thread.
+    When the queue is full, records are dropped instead of blocking; the
+    number dropped is logged as a WARNING once there is room again.
+    """
+
+    def __init__(self, maxsize=10000, stream=None):
+        self.maxsize = int(maxsize)
+        super().__init__(queue.Queue(maxsize=self.maxsize))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.target.setFormatter(JsonFormatter())
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # The inherited queue still holds the parent's pending records, and
+        # its locks may have been held by the parent's listener thread.
+        self.queue = queue.Queue(maxsize=self.maxsize)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        if self._pid is not None:
+            self._reset_after_fork()
+        self._pid = pid
+        self._listener = _Listener(self.queue, self.target, respect_handler_level=False)
+        self._listener.start()
+
+    def _dropped_record(self):
+        return logging.makeLogRecord({
+            'name': __name__,
+            'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': 'Dropped %d log records, queue full' % self.dropped,
+            'dropped': self.dropped,
+        })
+
+    def prepare(self, record):
+        # Only resolve the message and traceback here; the JSON rendering is
+        # left to the listener thread.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self._dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def close(self):
+        # Called by logging.shutdown() at exit: drain the queue, then report
+        # anything that was dropped and never accounted for.
+        if self._listener is not None and self._pid == os.getpid():
+            try:
+                self._listener.stop()
+            except queue.Full:
+                # The listener is stuck; write what is left ourselves.
+                while True:
+                    try:
+                        self.target.handle(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self._listener = None
+        if self.dropped:
+            self.target.handle(self._dropped_record())
+            self.dropped = 0
+        self.target.flush()
+        super().close()
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class RequestLogMiddleware:
+    """Log one record per request with latency, DB query count and response size."""
+
+    logger = logging.getLogger('galaxy.request')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return self.get_response(request)
+
+        from django.db import connection
+
+        counter = _QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        if response.streaming:
+            size = response.get('Content-Length')
+            size = int(size) if size is not None else None
+        else:
+            size = len(response.content)
+
+        self.logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'latency_ms': latency_ms,
+                'db_queries': counter.count,
+                'response_bytes': size,
+            },
+        )
+        return response
+
+
+def _self_check():
+    """Exercise the formatter, sample filter and drop-on-full path without Django."""
+    import io
+
+    record = logging.makeLogRecord({'name': 'pulp', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': 'hello %s', 'args': ('world',), 'latency_ms': 1.5})
+    data = json.loads(JsonFormatter().format(record))
+    assert data['message'] == 'hello world' and data['latency_ms'] == 1.5, data
+    record.level = 'overridden'
+    assert json.loads(JsonFormatter().format(record))['level'] == 'INFO'
+
+    debug = logging.makeLogRecord({'levelno': logging.DEBUG})
+    info = logging.makeLogRecord({'levelno': logging.INFO})
+    assert not any(DebugSampleFilter(0).filter(debug) for _ in range(1000))
+    assert all(DebugSampleFilter(1).filter(debug) for _ in range(1000))
+    assert DebugSampleFilter(0).filter(info)
+
+    stream = io.StringIO()
+    handler = AsyncJsonHandler(maxsize=2, stream=stream)
+    for _ in range(5):
+        handler.enqueue(handler.prepare(logging.makeLogRecord({'msg': 'fill'})))
+    assert handler.dropped == 3, handler.dropped
+    handler.queue.get_nowait()
+    handler.queue.get_nowait()
+    handler.enqueue(handler.prepare(logging.makeLogRecord({'msg': 'after'})))
+    assert handler.dropped == 0
+    assert handler.queue.get_nowait().dropped == 3
+    assert handler.queue.get_nowait().getMessage() == 'after'
+
+    handler.enqueue(handler.prepare(logging.makeLogRecord({'msg': 'fill'})))
+    handler.enqueue(handler.prepare(logging.makeLogRecord({'msg': 'fill'})))
+    handler.enqueue(handler.prepare(logging.makeLogRecord({'msg': 'lost'})))
+    handler.close()
+    assert json.loads(stream.getvalue().splitlines()[-1])['dropped'] == 1, stream.getvalue()
+
+    stream = io.StringIO()
+    handler = AsyncJsonHandler(stream=stream)
+    logger = logging.getLogger('galaxy_logging.self_check')
+    logger.addHandler(handler)
+    logger.warning('through the queue')
+    logger.removeHandler(handler)
+    handler.close()
+    assert json.loads(stream.getvalue())['message'] == 'through the queue', stream.getvalue()
+
+    class SlowStream(io.StringIO):
+        def write(self, text):
+            time.sleep(0.01)
+            return super().write(text)
+
+    stream = SlowStream()
+    handler = AsyncJsonHandler(maxsize=2, stream=stream)
+    logger.addHandler(handler)
+    for i in range(10):
+        logger.warning('burst %d', i)
+    logger.removeHandler(handler)
+    dropped = handler.dropped
+    handler.close()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert dropped and lines[-1]['dropped'] == dropped, lines
+    assert len(lines) == 10 - dropped + 1, lines
+
+    print('galaxy_logging self-check OK')
+
+
+if __name__ == '__main__':
+    _self_check()
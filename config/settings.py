@@ -1,4 +1,5 @@
 import os
+import sys
 
 # Django settings for Galaxy (Pulp) project.
 
@@ -53,37 +54,96 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 500 * 1024 * 1024  # 500MB
 
 # Logging
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'formatters': {
-        'simple': {
-            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# LOG_FORMAT=json switches to structured JSON written through a non-blocking
+# queue handler (see galaxy_logging.py), adds a per-request log record and
+# samples DEBUG output at LOG_DEBUG_SAMPLE_RATE (0.0 - 1.0).
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVEL_PULP = os.environ.get('LOG_LEVEL_PULP', 'DEBUG').upper()
+LOG_LEVEL_REQUEST = os.environ.get('LOG_LEVEL_REQUEST', LOG_LEVEL).upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+if LOG_FORMAT == 'json':
+    # galaxy_logging.py is mounted next to this file; make it importable.
+    _settings_dir = os.path.dirname(os.path.abspath(__file__))
+    if _settings_dir not in sys.path:
+        sys.path.append(_settings_dir)
+
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'filters': {
+            'debug_sample': {
+                '()': 'galaxy_logging.DebugSampleFilter',
+                'rate': LOG_DEBUG_SAMPLE_RATE,
+            },
         },
-    },
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple'
+        'handlers': {
+            'json': {
+                '()': 'galaxy_logging.AsyncJsonHandler',
+                'maxsize': LOG_QUEUE_SIZE,
+                'filters': ['debug_sample'],
+            },
         },
-    },
-    'root': {
-        'handlers': ['console'],
-        'level': 'INFO',
-    },
-    'loggers': {
-        'django': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': False,
+        'root': {
+            'handlers': ['json'],
+            'level': LOG_LEVEL,
+        },
+        'loggers': {
+            'django': {
+                'handlers': ['json'],
+                'level': LOG_LEVEL,
+                'propagate': False,
+            },
+            'pulp': {
+                'handlers': ['json'],
+                'level': LOG_LEVEL_PULP,
+                'propagate': False,
+            },
+            'galaxy.request': {
+                'handlers': ['json'],
+                'level': LOG_LEVEL_REQUEST,
+                'propagate': False,
+            },
+        },
+    }
+
+    # Insert as the outermost middleware so latency_ms and db_queries also
+    # cover session, auth, CSRF, etc., not just the view.
+    MIDDLEWARE = '@insert 0 galaxy_logging.RequestLogMiddleware'
+else:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'simple': {
+                'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            },
         },
-        'pulp': {
+        'handlers': {
+            'console': {
+                'class': 'logging.StreamHandler',
+                'formatter': 'simple'
+            },
+        },
+        'root': {
             'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
+            'level': LOG_LEVEL,
         },
-    },
-}
+        'loggers': {
+            'django': {
+                'handlers': ['console'],
+                'level': LOG_LEVEL,
+                'propagate': False,
+            },
+            'pulp': {
+                'handlers': ['console'],
+                'level': LOG_LEVEL_PULP,
+                'propagate': False,
+            },
+        },
+    }
 
 GALAXY_API_DEFAULT_DISTRIBUTION_BASE_PATH = os.environ.get('GALAXY_API_DEFAULT_DISTRIBUTION_BASE_PATH', 'published')
 GALAXY_API_STAGING_DISTRIBUTION_BASE_PATH = os.environ.get('GALAXY_API_STAGING_DISTRIBUTION_BASE_PATH', 'staging')